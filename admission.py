@@ -0,0 +1,224 @@
+import asyncio
+import os
+import re
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.routing import compile_path
+from dotenv import load_dotenv
+
+import auth
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+class Limiter:
+    """
+    Bounded concurrency plus a bounded wait queue for one route.
+    Waiting requests are served round-robin across teachers, and each
+    teacher has its own concurrency and queue caps, so one bulk uploader
+    cannot starve the others.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, per_teacher: int,
+                 per_teacher_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.per_teacher = per_teacher
+        self.per_teacher_queue = per_teacher_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.active = 0
+        self.active_by_key: Counter = Counter()
+        self.waiting: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self.queued = 0
+
+        self.admitted_total = 0
+        self.rejected_total: Counter = Counter()
+
+    @classmethod
+    def from_env(cls, name: str, max_concurrent: int, max_queue: int, per_teacher: int,
+                 per_teacher_queue: int, queue_timeout: float = 30, retry_after: int = 5) -> "Limiter":
+        """Reads ADMISSION_<NAME>_* overrides, e.g. ADMISSION_UPLOAD_PDF_MAX_CONCURRENT."""
+        prefix = "ADMISSION_" + name.upper().replace("-", "_") + "_"
+        return cls(
+            name,
+            max_concurrent=_env_int(prefix + "MAX_CONCURRENT", max_concurrent),
+            max_queue=_env_int(prefix + "MAX_QUEUE", max_queue),
+            per_teacher=_env_int(prefix + "PER_TEACHER", per_teacher),
+            per_teacher_queue=_env_int(prefix + "PER_TEACHER_QUEUE", per_teacher_queue),
+            queue_timeout=float(os.getenv(prefix + "QUEUE_TIMEOUT", str(queue_timeout))),
+            retry_after=_env_int(prefix + "RETRY_AFTER", retry_after),
+        )
+
+    def _reject(self, status_code: int, reason: str, detail: str):
+        self.rejected_total[reason] += 1
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def _grant(self, key: Hashable):
+        self.active += 1
+        self.active_by_key[key] += 1
+        self.admitted_total += 1
+
+    def _can_run(self, key: Hashable) -> bool:
+        return self.active < self.max_concurrent and self.active_by_key[key] < self.per_teacher
+
+    def _dispatch(self):
+        """Hands free slots to waiters, taking one from each eligible teacher in turn."""
+        while self.active < self.max_concurrent:
+            for key in self.waiting:
+                if self.active_by_key[key] < self.per_teacher:
+                    break
+            else:
+                return
+            waiters = self.waiting[key]
+            fut = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self.waiting.move_to_end(key)
+            else:
+                del self.waiting[key]
+            if fut.done():
+                continue
+            self._grant(key)
+            fut.set_result(None)
+
+    def _forget(self, key: Hashable, fut: asyncio.Future):
+        waiters = self.waiting.get(key)
+        if waiters is None or fut not in waiters:
+            return
+        waiters.remove(fut)
+        self.queued -= 1
+        if not waiters:
+            del self.waiting[key]
+
+    async def acquire(self, key: Hashable):
+        if self._can_run(key) and key not in self.waiting:
+            self._grant(key)
+            return
+        if self.queued >= self.max_queue:
+            self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "queue_full", "Server is busy, please retry later")
+        if len(self.waiting.get(key, ())) >= self.per_teacher_queue:
+            self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "teacher_queue_full", "Too many uploads in progress, please retry later")
+
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(key, deque()).append(fut)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._forget(key, fut)
+            if fut.done():
+                # Granted just as the timeout fired; take the slot
+                return
+            fut.cancel()
+            self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "queue_timeout", "Server is busy, please retry later")
+        except asyncio.CancelledError:
+            self._forget(key, fut)
+            if fut.done() and not fut.cancelled():
+                self.release(key)
+            fut.cancel()
+            raise
+
+    def release(self, key: Hashable):
+        self.active -= 1
+        self.active_by_key[key] -= 1
+        if self.active_by_key[key] <= 0:
+            del self.active_by_key[key]
+        self._dispatch()
+
+
+limiters: Dict[str, Limiter] = {}
+
+
+def register(limiter: Limiter) -> Limiter:
+    limiters[limiter.name] = limiter
+    return limiter
+
+
+upload_answer_sheet = register(Limiter.from_env(
+    "upload-answer-sheet", max_concurrent=8, max_queue=64, per_teacher=4, per_teacher_queue=16,
+))
+upload_pdf = register(Limiter.from_env(
+    "upload-pdf", max_concurrent=4, max_queue=16, per_teacher=1, per_teacher_queue=4,
+))
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that holds a limiter slot for the teacher of each request
+    to a limited route. It runs before the request body is read, so rejected
+    or queued uploads cost no upload bandwidth, disk or database session.
+
+    `routes` maps (method, path template) to a limiter, e.g.
+    ("POST", "/tests/upload-pdf/").
+    """
+
+    def __init__(self, app, routes: Dict[Tuple[str, str], Limiter]):
+        self.app = app
+        self.routes: List[Tuple[str, re.Pattern, Limiter]] = [
+            (method, compile_path(path)[0], limiter) for (method, path), limiter in routes.items()
+        ]
+
+    def match(self, scope) -> Optional[Limiter]:
+        if scope["type"] != "http":
+            return None
+        for method, path_regex, limiter in self.routes:
+            if scope["method"] == method and path_regex.match(scope["path"]):
+                return limiter
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.match(scope)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        scheme, token = get_authorization_scheme_param(headers.get(b"authorization", b"").decode("latin-1"))
+        try:
+            if scheme.lower() != "bearer":
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Not authenticated",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            teacher = auth.get_token_email(token)
+            await limiter.acquire(teacher)
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(teacher)
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of every registered limiter."""
+    lines = [
+        "# TYPE admission_in_flight gauge",
+        "# TYPE admission_queue_depth gauge",
+        "# TYPE admission_admitted_total counter",
+        "# TYPE admission_rejected_total counter",
+    ]
+    for name, limiter in limiters.items():
+        lines.append(f'admission_in_flight{{route="{name}"}} {limiter.active}')
+        lines.append(f'admission_queue_depth{{route="{name}"}} {limiter.queued}')
+        lines.append(f'admission_admitted_total{{route="{name}"}} {limiter.admitted_total}')
+        for reason in ("queue_full", "teacher_queue_full", "queue_timeout"):
+            lines.append(f'admission_rejected_total{{route="{name}",reason="{reason}"}} {limiter.rejected_total[reason]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,61 @@
+"""
+Compares rubric keyword scanning with the compiled Aho-Corasick matcher
+against naive per-keyword `in` checks, for growing rubric sizes.
+Each `in` check is a fast C loop, so the naive approach wins on tiny rubrics.
+The automaton's single pass wins once a rubric has more than a few dozen phrases.
+
+    python bench_rubric.py
+"""
+import random
+import time
+
+import rubric
+
+ANSWERS = 500
+ANSWER_WORDS = 150
+
+
+def make_rubric(num_terms: int, vocab):
+    terms = []
+    for i in range(num_terms):
+        keyword = " ".join(random.sample(vocab, random.randint(1, 2)))
+        synonyms = [" ".join(random.sample(vocab, random.randint(1, 2))) for _ in range(2)]
+        terms.append({"keyword": keyword, "synonyms": synonyms, "weight": 1.0})
+    return terms
+
+
+def naive_match(phrase_lists, answer: str):
+    # Same normalized text as the matcher sees; one substring check per phrase
+    text = rubric.normalize(answer)
+    return {idx for idx, phrases in enumerate(phrase_lists) if any(p in text for p in phrases)}
+
+
+def main():
+    random.seed(7)
+    vocab = [f"term{i}" for i in range(3000)]
+    answers = [" ".join(random.choices(vocab, k=ANSWER_WORDS)) for _ in range(ANSWERS)]
+    print(f"{ANSWERS} answers of {ANSWER_WORDS} words")
+    for num_terms in (10, 50, 200, 1000):
+        terms = make_rubric(num_terms, vocab)
+        phrase_lists = [[rubric.normalize(p) for p in [t["keyword"], *t["synonyms"]]] for t in terms]
+
+        start = time.perf_counter()
+        for answer in answers:
+            naive_match(phrase_lists, answer)
+        naive = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compiled = rubric.CompiledRubric(terms)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        for answer in answers:
+            compiled.matcher.find(rubric.normalize(answer))
+        automaton = time.perf_counter() - start
+
+        print(f"{num_terms:5d} keywords: naive {naive * 1000:8.1f} ms, "
+              f"automaton {automaton * 1000:8.1f} ms (+{build * 1000:.1f} ms compile), "
+              f"speedup {naive / automaton:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Measures how long a fresh interpreter takes to import the app and build it,
+i.e. the cold-start cost paid by every uvicorn worker.
+
+    python bench_startup.py [runs]
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+SNIPPET = """
+import time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+main.create_app()
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+"""
+
+
+def run_once():
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", SNIPPET], check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - start
+    import_time, factory_time = (float(x) for x in out.split())
+    return total, import_time, factory_time
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    samples = [run_once() for _ in range(runs)]
+    for label, values in zip(("process start to exit", "import main", "create_app()"), zip(*samples)):
+        print(f"{label:>22}: median {statistics.median(values) * 1000:7.1f} ms, "
+              f"min {min(values) * 1000:7.1f} ms over {runs} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from typing import Dict, Optional
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,17 +24,30 @@ SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{D
 if not os.getenv("DB_HOST"):
     SQLALCHEMY_DATABASE_URL = "sqlite:///./automated_checking.db"
 
+# Optional read replica for read-only endpoints, as a full SQLAlchemy URL
+# (e.g. sqlite:///./automated_checking_replica.db for local testing)
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+
+# After a write, the same teacher reads from the primary for this many seconds
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# After a failed connection, skip the replica for this many seconds
+REPLICA_RETRY_SECONDS = int(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
 # Engine configuration
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, pool_pre_ping=True
+def make_engine(url: str):
+    if "sqlite" in url:
+        return create_engine(
+            url, connect_args={"check_same_thread": False}
+        )
+    return create_engine(
+        url, pool_pre_ping=True
     )
 
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
+read_engine = make_engine(SQLALCHEMY_READ_DATABASE_URL) if SQLALCHEMY_READ_DATABASE_URL else engine
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -40,3 +57,50 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Per-process bookkeeping for read routing, keyed by teacher email
+_last_write: Dict[str, float] = {}
+_replica_down_until = 0.0
+
+def mark_write(teacher: str):
+    _last_write[teacher] = time.monotonic() + READ_YOUR_WRITES_SECONDS
+
+def is_sticky(teacher: str) -> bool:
+    """True if this teacher wrote recently and must keep reading from the primary."""
+    until = _last_write.get(teacher)
+    if until is None:
+        return False
+    if until <= time.monotonic():
+        _last_write.pop(teacher, None)
+        return False
+    return True
+
+def read_session(teacher: Optional[str]):
+    """
+    Session for read-only endpoints. Uses the replica when one is configured,
+    falling back to the primary if the replica recently failed to connect or
+    the teacher wrote within the last READ_YOUR_WRITES_SECONDS.
+    """
+    global _replica_down_until
+    if read_engine is engine or (teacher and is_sticky(teacher)) or time.monotonic() < _replica_down_until:
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+        try:
+            db.connection()
+        except OperationalError:
+            db.close()
+            _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+            db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    """
+    Read-only session for the teacher identified by the read-your-writes
+    middleware. Read endpoints should look the teacher up on this session
+    (auth.get_read_user) so they never hold a primary connection.
+    """
+    yield from read_session(getattr(request.state, "teacher", None))
@@ -0,0 +1,168 @@
+import asyncio
+import importlib
+from abc import ABC, abstractmethod
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds of silence before a keep-alive comment is sent to SSE clients
+HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+# Shared directory and poll interval of FileBroker
+EVENTS_DIR = os.getenv("EVENTS_DIR", os.path.join(tempfile.gettempdir(), "paper-checker-events"))
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "0.2"))
+
+
+class Broker(ABC):
+    """
+    Pub/sub interface used for live grading events.
+    Swap the implementation with EVENT_BROKER=module:ClassName, e.g.
+    EVENT_BROKER=events:FileBroker when running several workers.
+    """
+
+    @abstractmethod
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, topic: str, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yields events for `topic`, or None after `heartbeat` idle seconds."""
+
+
+class InProcessBroker(Broker):
+    """Fan-out to subscribers of this process only. Slow subscribers drop their oldest events."""
+
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Dict[str, Any]):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for loop, queue in subscribers:
+            # Safe from worker threads as well as from the event loop
+            loop.call_soon_threadsafe(self._offer, queue, event)
+
+    async def subscribe(self, topic: str, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.max_queue))
+        with self._lock:
+            self._subscribers[topic].add(entry)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(entry[1].get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[topic].discard(entry)
+                if not self._subscribers[topic]:
+                    del self._subscribers[topic]
+
+
+class FileBroker(Broker):
+    """
+    Broker shared by every worker process on one host, for multi-worker
+    setups without a broker service. Each topic is an append-only file of
+    JSON lines in `directory`, which subscribers poll for new lines.
+    A file is truncated once it grows past `max_bytes`; subscribers that
+    fall that far behind lose the events they had not read yet.
+    """
+
+    def __init__(self, directory: Optional[str] = None, poll: Optional[float] = None, max_bytes: int = 1 << 20):
+        self.directory = directory or EVENTS_DIR
+        self.poll = EVENTS_POLL_SECONDS if poll is None else poll
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, topic: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", topic) + ".jsonl")
+
+    @staticmethod
+    def _size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        line = (json.dumps(event) + "\n").encode()
+        fd = os.open(self._path(topic), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            if os.fstat(fd).st_size > self.max_bytes:
+                os.ftruncate(fd, 0)
+            # A single O_APPEND write keeps lines from different workers whole
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    async def subscribe(self, topic: str, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        path = self._path(topic)
+        # Only events published after subscribing are delivered
+        offset = self._size(path)
+        buffer = b""
+        idle = 0.0
+        while True:
+            size = self._size(path)
+            if size < offset:
+                # Truncated by a publisher; start over from the new content
+                offset, buffer = 0, b""
+            if size > offset:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read(size - offset)
+                offset += len(chunk)
+                *lines, buffer = (buffer + chunk).split(b"\n")
+                for line in lines:
+                    if line:
+                        yield json.loads(line)
+                idle = 0.0
+                continue
+            if heartbeat is not None and idle >= heartbeat:
+                idle = 0.0
+                yield None
+            await asyncio.sleep(self.poll)
+            idle += self.poll
+
+
+def load_broker() -> Broker:
+    path = os.getenv("EVENT_BROKER")
+    if not path:
+        return InProcessBroker()
+    module_name, _, class_name = path.partition(":")
+    broker_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(broker_class, type) and issubclass(broker_class, Broker)):
+        raise TypeError(f"EVENT_BROKER {path} is not an events.Broker subclass")
+    return broker_class()
+
+
+broker = load_broker()
+
+
+def test_topic(test_id: int) -> str:
+    return f"test:{test_id}"
+
+
+def publish(topic: str, event_type: str, **data: Any) -> None:
+    broker.publish(topic, {"type": event_type, **data})
+
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    """Encodes an event as a Server-Sent Events frame; None becomes a keep-alive comment."""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import signal
+import threading
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows dev machines have no rlimits
+    resource = None
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Sandbox configuration for PDF text extraction
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_WORKER_MAX_JOBS = int(os.getenv("PDF_WORKER_MAX_JOBS", "50"))
+PDF_TIMEOUT_SECONDS = int(os.getenv("PDF_TIMEOUT_SECONDS", "20"))
+PDF_MEMORY_LIMIT_MB = int(os.getenv("PDF_MEMORY_LIMIT_MB", "512"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+# How long a job may wait for a free worker before the caller gets a "busy" error
+PDF_QUEUE_TIMEOUT_SECONDS = int(os.getenv("PDF_QUEUE_TIMEOUT_SECONDS", "60"))
+
+# Extra time the parent waits beyond the in-worker alarm before giving up on a job
+_GRACE_SECONDS = 5
+
+
+class ExtractionError(Exception):
+    """Structured failure from a sandboxed extraction job."""
+
+    STATUS_CODES = {
+        "invalid_pdf": 400,
+        "too_many_pages": 413,
+        "memory_limit": 413,
+        "timeout": 422,
+        "busy": 503,
+        "worker_crashed": 500,
+    }
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    @property
+    def status_code(self) -> int:
+        return self.STATUS_CODES.get(self.code, 400)
+
+    def to_dict(self) -> dict:
+        return {"code": self.code, "message": self.message}
+
+
+class _JobTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _JobTimeout()
+
+
+def _init_worker(memory_limit_mb: int):
+    """Runs once in every worker process before it takes jobs."""
+    # Let the parent handle Ctrl+C; workers are torn down with the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, _on_alarm)
+    if resource is not None and memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run_job(file_path: str, timeout: int, max_pages: int) -> dict:
+    """Worker side of a job. Never raises; errors are returned as dicts."""
+    import utils
+
+    if resource is not None:
+        # CPU backstop in case the alarm cannot interrupt native code
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_used = int(used.ru_utime + used.ru_stime)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_used + timeout + 1, hard))
+    signal.alarm(timeout)
+    try:
+        text = utils.extract_text_from_pdf(file_path, max_pages=max_pages)
+        return {"ok": True, "text": text}
+    except _JobTimeout:
+        return {"ok": False, "code": "timeout", "message": f"Extraction took longer than {timeout}s"}
+    except MemoryError:
+        return {"ok": False, "code": "memory_limit", "message": f"Extraction exceeded {PDF_MEMORY_LIMIT_MB} MB"}
+    except utils.PageLimitError as e:
+        return {"ok": False, "code": "too_many_pages", "message": str(e)}
+    except Exception as e:
+        return {"ok": False, "code": "invalid_pdf", "message": str(e)}
+    finally:
+        signal.alarm(0)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# One slot per worker, so a job is only submitted when a worker can start it
+# right away and the run deadline below does not include time spent queueing
+_slots = threading.BoundedSemaphore(PDF_WORKERS)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn keeps workers free of the server's threads and open sockets
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ctx.Pool(
+                processes=PDF_WORKERS,
+                initializer=_init_worker,
+                initargs=(PDF_MEMORY_LIMIT_MB,),
+                maxtasksperchild=PDF_WORKER_MAX_JOBS,
+            )
+        return _pool
+
+
+def _retire_pool(pool, delay: float):
+    """
+    Stops sending jobs to `pool` and kills its workers after `delay` seconds.
+    Used when a worker outlives its deadline; the other jobs already running
+    in `pool` started earlier, so they are finished or timed out by then.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.close()
+    reaper = threading.Timer(delay, pool.terminate)
+    reaper.daemon = True
+    reaper.start()
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool.join()
+            _pool = None
+
+
+def extract_text(file_path: str, timeout: Optional[int] = None, max_pages: Optional[int] = None) -> str:
+    """
+    Extracts text from a PDF in a sandboxed worker process.
+    Blocks the calling thread, so call it from a threadpool in async routes.
+    Raises ExtractionError on any failure.
+    """
+    timeout = PDF_TIMEOUT_SECONDS if timeout is None else timeout
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+    if not _slots.acquire(timeout=PDF_QUEUE_TIMEOUT_SECONDS):
+        raise ExtractionError("busy", f"No extraction worker became free within {PDF_QUEUE_TIMEOUT_SECONDS}s")
+    try:
+        pool = get_pool()
+        job = pool.apply_async(_run_job, (file_path, timeout, max_pages))
+        # The worker enforces `timeout` itself; this only catches workers that died or hung mid-job
+        result = job.get(timeout=timeout + _GRACE_SECONDS)
+    except multiprocessing.TimeoutError:
+        # The worker may still be stuck; replace the pool so later jobs do not queue behind it
+        _retire_pool(pool, timeout + _GRACE_SECONDS)
+        raise ExtractionError("timeout", f"Extraction took longer than {timeout}s")
+    except Exception as e:
+        raise ExtractionError("worker_crashed", str(e))
+    finally:
+        _slots.release()
+    if not result["ok"]:
+        raise ExtractionError(result["code"], result["message"])
+    return result["text"]
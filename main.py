@@ -1,19 +1,25 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+import os
+import shutil
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
-import models, schemas, auth, database
-import models, schemas, auth, database, utils
-from database import engine, get_db
+import models, schemas, auth, database, utils, extraction, admission, events, versioning, similarity
+from database import get_db, get_read_db
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Uploaded answer sheets are kept here
+UPLOAD_DIR = "uploads"
 
-app = FastAPI(title="Automated Question Paper Checking System")
+# Schema changes are applied by `python migrate.py`, not on import
+router = APIRouter()
 
 # --- Authentication ---
 
-@app.post("/token", response_model=schemas.Token)
+@router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
     if not user or not auth.verify_password(form_data.password, user.hashed_password):
@@ -25,7 +31,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     access_token = auth.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.post("/register", response_model=schemas.User)
+@router.post("/register", response_model=schemas.User)
 def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
@@ -40,78 +46,94 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    # A replica may not have the new teacher yet
+    database.mark_write(db_user.email)
     return db_user
 
 # --- Subjects CRUD ---
 
-@app.post("/subjects/", response_model=schemas.Subject)
+@router.post("/subjects/", response_model=schemas.Subject)
 def create_subject(subject: schemas.SubjectCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_subject = models.Subject(**subject.dict(), teacher_id=current_user.id)
     db.add(db_subject)
+    versioning.bump(db, versioning.teacher_scope(current_user.id))
     db.commit()
     db.refresh(db_subject)
     return db_subject
 
-@app.get("/subjects/", response_model=List[schemas.Subject])
-def read_subjects(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/subjects/", response_model=List[schemas.Subject])
+def read_subjects(request: Request, response: Response, db: Session = Depends(get_read_db), current_user: models.User = Depends(auth.get_read_user)):
+    not_modified = versioning.check_not_modified(request, response, db, versioning.teacher_scope(current_user.id))
+    if not_modified:
+        return not_modified
     return db.query(models.Subject).filter(models.Subject.teacher_id == current_user.id).all()
 
-@app.put("/subjects/{subject_id}", response_model=schemas.Subject)
+@router.put("/subjects/{subject_id}", response_model=schemas.Subject)
 def update_subject(subject_id: int, subject: schemas.SubjectCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_subject = db.query(models.Subject).filter(models.Subject.id == subject_id, models.Subject.teacher_id == current_user.id).first()
     if not db_subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     db_subject.name = subject.name
+    versioning.bump(db, versioning.teacher_scope(current_user.id))
     db.commit()
     db.refresh(db_subject)
     return db_subject
 
-@app.delete("/subjects/{subject_id}")
+@router.delete("/subjects/{subject_id}")
 def delete_subject(subject_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_subject = db.query(models.Subject).filter(models.Subject.id == subject_id, models.Subject.teacher_id == current_user.id).first()
     if not db_subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     db.delete(db_subject)
+    versioning.bump(db, versioning.teacher_scope(current_user.id))
     db.commit()
     return {"message": "Subject deleted"}
 
 # --- Students CRUD ---
 
-@app.post("/students/", response_model=schemas.Student)
+@router.post("/students/", response_model=schemas.Student)
 def create_student(student: schemas.StudentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_student = models.Student(**student.dict())
     db.add(db_student)
+    versioning.bump(db, versioning.STUDENTS)
     db.commit()
     db.refresh(db_student)
     return db_student
 
-@app.get("/students/", response_model=List[schemas.Student])
-def read_students(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/students/", response_model=List[schemas.Student])
+def read_students(request: Request, response: Response, db: Session = Depends(get_read_db), current_user: models.User = Depends(auth.get_read_user)):
+    not_modified = versioning.check_not_modified(request, response, db, versioning.STUDENTS)
+    if not_modified:
+        return not_modified
     return db.query(models.Student).all()
 
-@app.put("/students/{student_id}", response_model=schemas.Student)
+@router.put("/students/{student_id}", response_model=schemas.Student)
 def update_student(student_id: int, student: schemas.StudentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_student = db.query(models.Student).filter(models.Student.id == student_id).first()
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
     for key, value in student.dict().items():
         setattr(db_student, key, value)
+    versioning.bump(db, versioning.STUDENTS)
     db.commit()
     db.refresh(db_student)
     return db_student
 
-@app.delete("/students/{student_id}")
+@router.delete("/students/{student_id}")
 def delete_student(student_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_student = db.query(models.Student).filter(models.Student.id == student_id).first()
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
+    # The student's results and similarity matches disappear from these tests too
+    test_ids = sorted({r.test_id for r in db_student.results if r.test_id is not None})
     db.delete(db_student)
+    versioning.bump(db, versioning.STUDENTS, *[versioning.test_scope(t) for t in test_ids])
     db.commit()
     return {"message": "Student deleted"}
 
 # --- Tests CRUD ---
 
-@app.post("/tests/", response_model=schemas.Test)
+@router.post("/tests/", response_model=schemas.Test)
 def create_test(test: schemas.TestCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     # Verify subject belongs to teacher
     subject = db.query(models.Subject).filter(models.Subject.id == test.subject_id, models.Subject.teacher_id == current_user.id).first()
@@ -130,24 +152,29 @@ def create_test(test: schemas.TestCreate, db: Session = Depends(get_db), current
     )
     db_test.students = students
     db.add(db_test)
+    versioning.bump(db, versioning.teacher_scope(current_user.id))
     db.commit()
     db.refresh(db_test)
     return db_test
 
-@app.get("/tests/", response_model=List[schemas.Test])
-def read_tests(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/tests/", response_model=List[schemas.Test])
+def read_tests(request: Request, response: Response, db: Session = Depends(get_read_db), current_user: models.User = Depends(auth.get_read_user)):
+    not_modified = versioning.check_not_modified(request, response, db, versioning.teacher_scope(current_user.id))
+    if not_modified:
+        return not_modified
     return db.query(models.Test).join(models.Subject).filter(models.Subject.teacher_id == current_user.id).all()
 
-@app.delete("/tests/{test_id}")
+@router.delete("/tests/{test_id}")
 def delete_test(test_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_test = db.query(models.Test).join(models.Subject).filter(models.Test.id == test_id, models.Subject.teacher_id == current_user.id).first()
     if not db_test:
         raise HTTPException(status_code=404, detail="Test not found")
     db.delete(db_test)
+    versioning.bump(db, versioning.teacher_scope(current_user.id), versioning.test_scope(test_id))
     db.commit()
     return {"message": "Test deleted"}
 
-@app.put("/tests/{test_id}", response_model=schemas.Test)
+@router.put("/tests/{test_id}", response_model=schemas.Test)
 def update_test(test_id: int, test: schemas.TestCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     # Check if test exists and belongs to user's subject
     db_test = db.query(models.Test).join(models.Subject).filter(models.Test.id == test_id, models.Subject.teacher_id == current_user.id).first()
@@ -169,13 +196,14 @@ def update_test(test_id: int, test: schemas.TestCreate, db: Session = Depends(ge
     students = db.query(models.Student).filter(models.Student.id.in_(test.student_ids)).all()
     db_test.students = students
 
+    versioning.bump(db, versioning.teacher_scope(current_user.id), versioning.test_scope(test_id))
     db.commit()
     db.refresh(db_test)
     return db_test
 
     return db_test
 
-@app.post("/tests/upload-pdf/", response_model=Dict[str, Any])
+@router.post("/tests/upload-pdf/", response_model=Dict[str, Any])
 async def parse_pdf_create_test(
     file: UploadFile = File(...),
     current_user: models.User = Depends(auth.get_current_user)
@@ -191,7 +219,7 @@ async def parse_pdf_create_test(
             shutil.copyfileobj(file.file, buffer)
             
         # Extract text
-        text = utils.extract_text_from_pdf(file_path)
+        text = await run_in_threadpool(extraction.extract_text, file_path)
         
         # Parse Q&A
         qa_pairs = utils.parse_qa_from_text(text)
@@ -210,13 +238,17 @@ async def parse_pdf_create_test(
             
         return {"extracted_data": extracted_questions, "raw_text_preview": text[:500]}
         
+    except extraction.ExtractionError as e:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise HTTPException(status_code=e.status_code, detail=e.to_dict())
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error parsing PDF: {str(e)}")
 
 # --- Dashboard ---
 
-@app.get("/dashboard/", response_model=schemas.DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/dashboard/", response_model=schemas.DashboardStats)
+def get_dashboard_stats(db: Session = Depends(get_read_db), current_user: models.User = Depends(auth.get_read_user)):
     # Total counts
     total_subjects = db.query(models.Subject).filter(models.Subject.teacher_id == current_user.id).count()
     
@@ -247,71 +279,34 @@ def get_dashboard_stats(db: Session = Depends(get_db), current_user: models.User
         "recent_students": recent_students_data
     }
 
+# --- Metrics ---
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return admission.render_metrics()
+
 # --- Teacher Profile ---
 
-@app.get("/profile/", response_model=schemas.User)
-def get_profile(current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/profile/", response_model=schemas.User)
+def get_profile(request: Request, response: Response, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+    not_modified = versioning.check_not_modified(request, response, db, versioning.teacher_scope(current_user.id))
+    if not_modified:
+        return not_modified
     return current_user
 
-@app.put("/profile/", response_model=schemas.User)
+@router.put("/profile/", response_model=schemas.User)
 def update_profile(user_update: schemas.UserBase, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     current_user.full_name = user_update.full_name
     current_user.mobile = user_update.mobile
     current_user.email = user_update.email
+    versioning.bump(db, versioning.teacher_scope(current_user.id))
     db.commit()
     db.refresh(current_user)
     return current_user
 
-import os
-import shutil
-from typing import Dict
-
-# Create uploads directory
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 # --- Answer Sheet Processing ---
 
-def check_answers(student_answers: List[Dict[str, str]], question_paper: List[Dict[str, Any]]) -> tuple[float, List[Dict[str, Any]]]:
-    """
-    Simple automated checking logic. 
-    In a real scenario, this would use OCR and NLP.
-    For this implementation, we'll compare strings.
-    """
-    total_score = 0.0
-    processed_answers = []
-    
-    # Create a map for quick lookup
-    paper_map = {q['question']: q for q in question_paper}
-    
-    for ans in student_answers:
-        q_text = ans.get('question')
-        s_ans = ans.get('answer', '').strip().lower()
-        
-        if q_text in paper_map:
-            correct_ans = paper_map[q_text]['answer'].strip().lower()
-            marks = paper_map[q_text]['marks']
-            
-            # Simple exact match or keyword match
-            if s_ans == correct_ans:
-                obtained = marks
-            elif correct_ans in s_ans: # Partial match logic
-                obtained = marks * 0.8
-            else:
-                obtained = 0.0
-                
-            total_score += obtained
-            processed_answers.append({
-                "question": q_text,
-                "student_answer": s_ans,
-                "correct_answer": correct_ans,
-                "marks_obtained": obtained,
-                "max_marks": marks
-            })
-            
-    return total_score, processed_answers
-
-@app.post("/tests/{test_id}/students/{student_id}/upload-answer-sheet/")
+@router.post("/tests/{test_id}/students/{student_id}/upload-answer-sheet/")
 async def upload_answer_sheet(
     test_id: int, 
     student_id: int, 
@@ -331,20 +326,27 @@ async def upload_answer_sheet(
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
         
+    topic = events.test_topic(test_id)
+
     # Parse PDF Answer Sheet
     try:
         # Extract text
-        text = utils.extract_text_from_pdf(file_path)
+        text = await run_in_threadpool(extraction.extract_text, file_path)
         
         # Parse Q&A
         parsed_student_answers = utils.parse_qa_from_text(text)
+        events.publish(topic, "extracted", student_id=student_id, answers_found=len(parsed_student_answers))
         
         # Check against Test Questions
-        score, processed_results = check_answers(parsed_student_answers, test.question_paper)
+        score, processed_results = utils.check_answers(parsed_student_answers, test.question_paper)
         
+    except extraction.ExtractionError as e:
+        events.publish(topic, "error", student_id=student_id, error=e.to_dict())
+        raise HTTPException(status_code=e.status_code, detail=e.to_dict())
     except Exception as e:
         # Fallback or Error
         print(f"Error parsing PDF: {e}")
+        events.publish(topic, "error", student_id=student_id, error={"code": "parse_failed", "message": str(e)})
         # If parsing fails, we could either error out or return 0
         raise HTTPException(status_code=400, detail=f"Failed to parse Answer Sheet PDF: {str(e)}")
     
@@ -358,9 +360,12 @@ async def upload_answer_sheet(
         student_answers=processed_results,
         answer_sheet_url=file_path
     )
+    similarity.index_result(db_result)
     db.add(db_result)
+    versioning.bump(db, versioning.test_scope(test_id))
     db.commit()
     db.refresh(db_result)
+    events.publish(topic, "graded", student_id=student_id, result_id=db_result.id, score=score, max_marks=test.max_marks)
     
     return {
         "message": "Answer sheet processed successfully",
@@ -369,11 +374,73 @@ async def upload_answer_sheet(
         "file_path": file_path
     }
 
-@app.get("/tests/{test_id}/results/", response_model=List[schemas.TestResult])
-def get_test_results(test_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/tests/{test_id}/results/", response_model=List[schemas.TestResult])
+def get_test_results(test_id: int, request: Request, response: Response, db: Session = Depends(get_read_db), current_user: models.User = Depends(auth.get_read_user)):
+    not_modified = versioning.check_not_modified(request, response, db, versioning.test_scope(test_id))
+    if not_modified:
+        return not_modified
     return db.query(models.TestResult).filter(models.TestResult.test_id == test_id).all()
 
-@app.put("/results/{result_id}", response_model=schemas.TestResult)
+@router.get("/tests/{test_id}/similarity", response_model=schemas.SimilarityReport)
+def get_test_similarity(
+    test_id: int,
+    request: Request,
+    response: Response,
+    threshold: float = Query(0.8, ge=0.5, le=1.0),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(auth.get_read_user)
+):
+    """
+    Groups of students whose answers to the same question are near-duplicates,
+    found through MinHash signatures computed when each sheet was graded.
+    """
+    db_test = db.query(models.Test).join(models.Subject).filter(models.Test.id == test_id, models.Subject.teacher_id == current_user.id).first()
+    if not db_test:
+        raise HTTPException(status_code=404, detail="Test not found")
+    not_modified = versioning.check_not_modified(request, response, db, versioning.test_scope(test_id))
+    if not_modified:
+        return not_modified
+
+    rows = db.query(
+        models.AnswerSignature.result_id,
+        models.AnswerSignature.student_id,
+        models.AnswerSignature.question_key,
+        models.AnswerSignature.signature,
+        models.AnswerSignature.bands,
+    ).filter(models.AnswerSignature.test_id == test_id).all()
+    model_answers = similarity.model_answer_signatures(db_test.question_paper)
+    clusters = similarity.find_similar_clusters(rows, threshold, model_answers)
+
+    questions = {similarity.question_key(q["question"]): q["question"] for q in db_test.question_paper or []}
+    for cluster in clusters:
+        cluster["question"] = questions.get(cluster.pop("question_key"), "")
+    return {"test_id": test_id, "threshold": threshold, "clusters": clusters}
+
+@router.get("/tests/{test_id}/events")
+async def stream_test_events(test_id: int, request: Request, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+    """
+    Server-Sent Events stream of per-sheet grading progress for a test:
+    `extracted`, `graded` (with score) and `error` events.
+    """
+    db_test = db.query(models.Test).join(models.Subject).filter(models.Test.id == test_id, models.Subject.teacher_id == current_user.id).first()
+    if not db_test:
+        raise HTTPException(status_code=404, detail="Test not found")
+    # Give the connection back to the pool; the stream can stay open for a long time
+    db.close()
+
+    async def event_stream():
+        async for event in events.broker.subscribe(events.test_topic(test_id), heartbeat=events.HEARTBEAT_SECONDS):
+            if await request.is_disconnected():
+                break
+            yield events.format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.put("/results/{result_id}", response_model=schemas.TestResult)
 def update_result(
     result_id: int, 
     result_update: schemas.TestResultBase, 
@@ -389,11 +456,52 @@ def update_result(
     
     db_result.score = result_update.score
     db_result.student_answers = result_update.student_answers
+    similarity.index_result(db_result)
     
+    versioning.bump(db, versioning.test_scope(db_result.test_id))
     db.commit()
     db.refresh(db_result)
     return db_result
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    yield
+    extraction.shutdown_pool()
+
+async def read_your_writes(request: Request, call_next):
+    """
+    Pins a teacher to the primary database for a short while after they write.
+    The teacher is taken from the token alone, so picking a database for
+    get_read_db costs no query.
+    """
+    scheme, token = get_authorization_scheme_param(request.headers.get("authorization"))
+    teacher = None
+    if scheme.lower() == "bearer":
+        try:
+            teacher = auth.get_token_email(token)
+        except HTTPException:
+            pass
+    request.state.teacher = teacher
+    response = await call_next(request)
+    if teacher is not None and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        database.mark_write(teacher)
+    return response
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="Automated Question Paper Checking System", lifespan=lifespan)
+    app.include_router(router)
+    # Uploads are admitted before their body is read
+    app.add_middleware(admission.AdmissionMiddleware, routes={
+        ("POST", "/tests/upload-pdf/"): admission.upload_pdf,
+        ("POST", "/tests/{test_id}/students/{student_id}/upload-answer-sheet/"): admission.upload_answer_sheet,
+    })
+    if database.read_engine is not database.engine:
+        app.middleware("http")(read_your_writes)
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,32 @@
+"""
+Creates any missing database tables and indexes answer sheets graded
+before the similarity check existed. Run once per deploy, before starting the API workers:
+
+    python migrate.py [--replica]
+
+--replica also creates the tables on READ_DATABASE_URL, for local setups
+where the "replica" is a second SQLite file rather than a real replica.
+"""
+import sys
+import models, similarity
+from database import engine, read_engine, SessionLocal
+
+
+def migrate(include_replica: bool = False):
+    models.Base.metadata.create_all(bind=engine)
+    if include_replica and read_engine is not engine:
+        models.Base.metadata.create_all(bind=read_engine)
+    db = SessionLocal()
+    try:
+        return similarity.backfill_signatures(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    include_replica = "--replica" in sys.argv[1:]
+    indexed = migrate(include_replica)
+    print(f"Schema is up to date on {engine.url.render_as_string(hide_password=True)}")
+    print(f"Indexed {indexed} previously graded answer sheets for similarity checks")
+    if include_replica and read_engine is not engine:
+        print(f"Schema is up to date on {read_engine.url.render_as_string(hide_password=True)}")
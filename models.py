@@ -35,6 +35,7 @@ class Student(Base):
     mobile = Column(String(15))
     tests = relationship("Test", secondary=test_students, back_populates="students")
     results = relationship("TestResult", back_populates="student")
+    signatures = relationship("AnswerSignature", back_populates="student", cascade="all, delete-orphan")
 
 class Test(Base):
     __tablename__ = "tests"
@@ -47,6 +48,7 @@ class Test(Base):
     subject = relationship("Subject", back_populates="tests")
     students = relationship("Student", secondary=test_students, back_populates="tests")
     results = relationship("TestResult", back_populates="test")
+    signatures = relationship("AnswerSignature", back_populates="test", cascade="all, delete-orphan")
 
 class TestResult(Base):
     __tablename__ = "test_results"
@@ -59,3 +61,30 @@ class TestResult(Base):
 
     test = relationship("Test", back_populates="results")
     student = relationship("Student", back_populates="results")
+    signatures = relationship("AnswerSignature", back_populates="result", cascade="all, delete-orphan")
+    indexed = relationship("IndexedResult", uselist=False, cascade="all, delete-orphan")
+
+class AnswerSignature(Base):
+    __tablename__ = "answer_signatures"
+    id = Column(Integer, primary_key=True, index=True)
+    test_id = Column(Integer, ForeignKey("tests.id", ondelete="CASCADE"), index=True)
+    result_id = Column(Integer, ForeignKey("test_results.id", ondelete="CASCADE"), index=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), index=True)
+    question_key = Column(String(32))
+    signature = Column(JSON)
+    bands = Column(JSON)
+
+    result = relationship("TestResult", back_populates="signatures")
+    test = relationship("Test", back_populates="signatures")
+    student = relationship("Student", back_populates="signatures")
+
+class IndexedResult(Base):
+    # Marks results already signed for similarity checks, including those
+    # whose answers were all too short to get a signature
+    __tablename__ = "indexed_results"
+    result_id = Column(Integer, ForeignKey("test_results.id", ondelete="CASCADE"), primary_key=True)
+
+class ResourceVersion(Base):
+    __tablename__ = "resource_versions"
+    scope = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
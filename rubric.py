@@ -0,0 +1,115 @@
+import json
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, List, Set, Tuple
+
+
+def normalize(text: str) -> str:
+    """Lowercases and reduces text to single-space separated words."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a fixed set of phrases. `find` scans a text
+    once and reports every phrase that occurs as whole words, however many
+    phrases there are.
+    """
+
+    def __init__(self, phrases: Dict[str, int]):
+        # phrases maps normalized phrase -> value reported when it matches
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int]]] = [[]]
+
+        for phrase, value in phrases.items():
+            if not phrase:
+                continue
+            node = 0
+            for ch in phrase:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((value, len(phrase)))
+
+        # Breadth-first pass to link each node to its longest proper suffix in the trie
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[int]:
+        """Values of all phrases found in `text`, which must already be normalized."""
+        found = set()
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        end = len(text)
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            # Only accept matches that start and end on word boundaries
+            if i + 1 < end and text[i + 1] != " ":
+                continue
+            for value, length in out[node]:
+                start = i - length + 1
+                if start == 0 or text[start - 1] == " ":
+                    found.add(value)
+        return found
+
+
+class CompiledRubric:
+    """Rubric of one question, ready to score answers."""
+
+    def __init__(self, terms: List[Dict[str, Any]]):
+        self.terms = terms
+        self.total_weight = sum(t.get("weight", 1.0) for t in terms)
+        phrases = {}
+        for idx, term in enumerate(terms):
+            for phrase in [term["keyword"], *term.get("synonyms", [])]:
+                phrases.setdefault(normalize(phrase), idx)
+        self.matcher = KeywordMatcher(phrases)
+
+    def score(self, answer: str) -> Tuple[float, List[str]]:
+        """Returns the fraction of marks earned and the keywords that matched."""
+        matched = self.matcher.find(normalize(answer))
+        keywords = [self.terms[idx]["keyword"] for idx in sorted(matched)]
+        if any(t.get("required") and idx not in matched for idx, t in enumerate(self.terms)):
+            return 0.0, keywords
+        if not self.total_weight:
+            return 0.0, keywords
+        earned = sum(self.terms[idx].get("weight", 1.0) for idx in matched)
+        return earned / self.total_weight, keywords
+
+
+@lru_cache(maxsize=128)
+def _compile(rubrics_json: str) -> Dict[str, CompiledRubric]:
+    return {q: CompiledRubric(terms) for q, terms in json.loads(rubrics_json).items()}
+
+
+def compile_paper(question_paper: List[Dict[str, Any]]) -> Dict[str, CompiledRubric]:
+    """
+    Compiled rubrics of a question paper keyed by question text. The result is
+    cached on the rubric contents, so a test's rubric is compiled once and
+    reused for every sheet graded against it.
+    """
+    rubrics: Dict[str, List[Dict[str, Any]]] = {
+        q["question"]: q["rubric"] for q in question_paper if q.get("rubric")
+    }
+    if not rubrics:
+        return {}
+    return _compile(json.dumps(rubrics, sort_keys=True))
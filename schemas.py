@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional, Dict, Any
 
 # User/Teacher Schemas
@@ -51,10 +51,18 @@ class Student(StudentBase):
         from_attributes = True
 
 # Test Schemas
+class RubricTerm(BaseModel):
+    keyword: str
+    synonyms: List[str] = []
+    weight: float = Field(1.0, gt=0)
+    required: bool = False
+
 class Question(BaseModel):
     question: str
     answer: str
     marks: float
+    # Optional keyword rubric; when set, answers are marked by the weighted keywords they contain
+    rubric: Optional[List[RubricTerm]] = None
 
 class TestBase(BaseModel):
     title: str
@@ -80,6 +88,8 @@ class TestResultBase(BaseModel):
 
 class TestResult(TestResultBase):
     id: int
+    # None once the student has been deleted
+    student_id: Optional[int] = None
     class Config:
         from_attributes = True
 
@@ -91,3 +101,19 @@ class DashboardStats(BaseModel):
     average_score: float
     recent_tests: List[Dict[str, Any]]
     recent_students: List[Dict[str, Any]]
+
+# Similarity Schemas
+class SimilarAnswer(BaseModel):
+    student_id: int
+    result_id: int
+
+class SimilarCluster(BaseModel):
+    question: str
+    # Lowest estimated similarity between answers that were linked into the cluster
+    similarity: float
+    answers: List[SimilarAnswer]
+
+class SimilarityReport(BaseModel):
+    test_id: int
+    threshold: float
+    clusters: List[SimilarCluster]
@@ -0,0 +1,187 @@
+import hashlib
+import random
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import models
+
+# MinHash parameters. With 16 bands of 4 rows, pairs with Jaccard similarity
+# 0.5 become candidates ~64% of the time, and pairs at 0.7 ~99% of the time.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Shorter answers (one-word facts, numbers) are identical for every correct
+# student, so they say nothing about copying.
+MIN_TOKENS = 6
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def _hash64(data: str) -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), "big")
+
+
+def question_key(question: str) -> str:
+    return hashlib.sha1(question.strip().lower().encode()).hexdigest()[:32]
+
+
+def shingles(text: str) -> Set[int]:
+    """Hashed word 3-grams of `text`; empty if the answer is too short to compare."""
+    tokens = re.findall(r"\w+", text.lower())
+    if len(tokens) < MIN_TOKENS:
+        return set()
+    return {_hash64(" ".join(tokens[i:i + SHINGLE_SIZE])) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_hashes: Set[int]) -> List[int]:
+    return [min((a * x + b) % _PRIME for x in shingle_hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature: List[int]) -> List[str]:
+    return [
+        hashlib.blake2b(repr(signature[i * ROWS:(i + 1) * ROWS]).encode(), digest_size=8).hexdigest()
+        for i in range(BANDS)
+    ]
+
+
+def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def sign_answers(processed_answers: List[Dict[str, Any]]) -> List[Tuple[str, List[int], List[str]]]:
+    """
+    Computes (question_key, signature, band_keys) for every graded answer long
+    enough to compare. Called once per sheet at grading time.
+    """
+    signed = []
+    for ans in processed_answers:
+        if not ans.get("question"):
+            continue
+        hashes = shingles(ans.get("student_answer") or "")
+        if not hashes:
+            continue
+        signature = minhash(hashes)
+        signed.append((question_key(ans["question"]), signature, band_keys(signature)))
+    return signed
+
+
+def model_answer_signatures(question_paper: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """Signatures of a test's model answers keyed by question_key, for answers long enough to compare."""
+    signatures = {}
+    for q in question_paper or []:
+        hashes = shingles(q.get("answer") or "")
+        if hashes:
+            signatures[question_key(q["question"])] = minhash(hashes)
+    return signatures
+
+
+def index_result(db_result: models.TestResult):
+    """Replaces the stored signatures of a result with ones for its current answers."""
+    db_result.signatures = [
+        models.AnswerSignature(
+            test_id=db_result.test_id,
+            student_id=db_result.student_id,
+            question_key=q_key,
+            signature=signature,
+            bands=bands,
+        )
+        for q_key, signature, bands in sign_answers(db_result.student_answers or [])
+    ]
+    if db_result.indexed is None:
+        db_result.indexed = models.IndexedResult()
+
+
+def backfill_signatures(db, batch_size: int = 500) -> int:
+    """
+    Indexes results that have never been through index_result, e.g. sheets
+    graded before the similarity index existed, committing every
+    `batch_size` results. Returns the number of results indexed.
+    """
+    indexed = 0
+    while True:
+        batch = (
+            db.query(models.TestResult)
+            .outerjoin(models.IndexedResult)
+            .filter(models.IndexedResult.result_id.is_(None), models.TestResult.test_id.isnot(None))
+            .order_by(models.TestResult.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return indexed
+        for db_result in batch:
+            index_result(db_result)
+        db.commit()
+        indexed += len(batch)
+
+
+def find_similar_clusters(
+    rows: Iterable[Tuple[int, int, str, List[int], List[str]]],
+    threshold: float,
+    model_answers: Optional[Dict[str, List[int]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    `rows` are (result_id, student_id, question_key, signature, bands) and
+    `model_answers` maps question_key to the model answer's signature.
+
+    Answers that are near-duplicates of the model answer are dropped first,
+    like short answers: every correct student writes them. The rest are
+    grouped with union-find over the LSH buckets. Each answer in a bucket
+    is only compared with the bucket's first answer, so the work stays
+    linear in the number of answers even when a whole class hands in the
+    same text, which then comes back as a single cluster.
+    """
+    model_answers = model_answers or {}
+    rows = [
+        row for row in rows
+        if row[2] not in model_answers or estimate_similarity(row[3], model_answers[row[2]]) < threshold
+    ]
+    buckets: Dict[Tuple[str, int, str], List[int]] = defaultdict(list)
+    for idx, (_, _, q_key, _, bands) in enumerate(rows):
+        for band, key in enumerate(bands):
+            buckets[(q_key, band, key)].append(idx)
+
+    parent = list(range(len(rows)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Lowest similarity of the links that formed each cluster, keyed by its root
+    lowest: Dict[int, float] = {}
+    for members in buckets.values():
+        first = members[0]
+        for other in members[1:]:
+            root_a, root_b = find(first), find(other)
+            if root_a == root_b:
+                continue
+            score = estimate_similarity(rows[first][3], rows[other][3])
+            if score < threshold:
+                continue
+            parent[root_b] = root_a
+            lowest[root_a] = min(score, lowest.pop(root_a, 1.0), lowest.pop(root_b, 1.0))
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for idx in range(len(rows)):
+        groups[find(idx)].append(idx)
+
+    clusters = []
+    for root, members in groups.items():
+        # Latest sheet per student; re-uploads of one student are not a match
+        latest: Dict[int, int] = {}
+        for idx in members:
+            result_id, student_id = rows[idx][0], rows[idx][1]
+            latest[student_id] = max(result_id, latest.get(student_id, result_id))
+        if len(latest) < 2:
+            continue
+        clusters.append({
+            "question_key": rows[root][2],
+            "similarity": lowest[root],
+            "answers": [{"student_id": s, "result_id": r} for s, r in sorted(latest.items())],
+        })
+    return sorted(clusters, key=lambda c: (c["similarity"], len(c["answers"])), reverse=True)
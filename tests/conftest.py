@@ -0,0 +1,53 @@
+import os
+import sys
+
+# Use the local SQLite fallback instead of the MySQL server from .env
+os.environ["DB_HOST"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    import models
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def enable_foreign_keys(dbapi_connection, connection_record):
+        # Enforce FKs like InnoDB does in production
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client(db_engine, tmp_path, monkeypatch):
+    import database, main
+    TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+
+    def override_get_db():
+        db = TestingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(main, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    app = main.create_app()
+    app.dependency_overrides[database.get_db] = override_get_db
+    app.dependency_overrides[database.get_read_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    client.post("/register", json={"email": "teacher@example.com", "password": "secret", "full_name": "Teacher", "mobile": "1"})
+    token = client.post("/token", data={"username": "teacher@example.com", "password": "secret"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
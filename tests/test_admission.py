@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+from admission import AdmissionMiddleware, Limiter
+
+
+def make_limiter(**overrides):
+    options = dict(max_concurrent=2, max_queue=4, per_teacher=2, per_teacher_queue=3,
+                   queue_timeout=1.0, retry_after=7)
+    options.update(overrides)
+    return Limiter("test", **options)
+
+
+def test_waiters_are_served_round_robin_across_teachers():
+    async def scenario():
+        limiter = make_limiter()
+        order = []
+
+        async def job(teacher, n):
+            await limiter.acquire(teacher)
+            order.append((teacher, n))
+            await asyncio.sleep(0.01)
+            limiter.release(teacher)
+
+        tasks = [asyncio.create_task(job("bulk", n)) for n in range(5)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("other", 0)))
+        await asyncio.gather(*tasks)
+        return order, limiter
+
+    order, limiter = asyncio.run(scenario())
+    # "other" arrived behind three queued bulk uploads but only waits for one of them
+    assert order.index(("other", 0)) < order.index(("bulk", 3))
+    assert limiter.active == 0 and limiter.queued == 0
+    assert limiter.admitted_total == 6
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        limiter = make_limiter(max_concurrent=1, max_queue=1, per_teacher=1)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            await limiter.acquire("c")
+        limiter.release("a")
+        await waiter
+        limiter.release("b")
+        return exc.value, limiter
+
+    error, limiter = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "7"
+    assert limiter.rejected_total["queue_full"] == 1
+    assert limiter.active == 0 and limiter.queued == 0
+
+
+def test_per_teacher_queue_is_rejected_with_429():
+    async def scenario():
+        limiter = make_limiter(max_concurrent=1, per_teacher=1, per_teacher_queue=1)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            await limiter.acquire("a")
+        # Another teacher can still queue
+        other = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        assert limiter.queued == 2
+        waiter.cancel()
+        other.cancel()
+        await asyncio.gather(waiter, other, return_exceptions=True)
+        limiter.release("a")
+        return exc.value, limiter
+
+    error, limiter = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert limiter.rejected_total["teacher_queue_full"] == 1
+    assert limiter.active == 0 and limiter.queued == 0
+
+
+def test_queue_wait_times_out_with_503():
+    async def scenario():
+        limiter = make_limiter(max_concurrent=1, queue_timeout=0.05)
+        await limiter.acquire("a")
+        with pytest.raises(HTTPException) as exc:
+            await limiter.acquire("b")
+        limiter.release("a")
+        return exc.value, limiter
+
+    error, limiter = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert limiter.rejected_total["queue_timeout"] == 1
+    assert limiter.active == 0 and limiter.queued == 0 and not limiter.waiting
+
+
+def call_upload(limiter, headers):
+    """Sends one upload through AdmissionMiddleware; returns the status and whether the body was read."""
+    body_read = []
+
+    async def inner_app(scope, receive, send):
+        await receive()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        body_read.append(True)
+        return {"type": "http.request", "body": b"%PDF-", "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = AdmissionMiddleware(inner_app, routes={("POST", "/tests/{test_id}/upload/"): limiter})
+    scope = {"type": "http", "method": "POST", "path": "/tests/1/upload/", "headers": headers}
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], bool(body_read)
+
+
+def test_middleware_rejects_before_reading_the_body():
+    limiter = make_limiter(max_concurrent=0, max_queue=0)
+    token = auth.create_access_token({"sub": "teacher@example.com"})
+    status, body_read = call_upload(limiter, [(b"authorization", f"Bearer {token}".encode())])
+    assert status == 503
+    assert not body_read
+    assert limiter.rejected_total["queue_full"] == 1
+
+
+def test_middleware_rejects_missing_token_with_401():
+    limiter = make_limiter()
+    status, body_read = call_upload(limiter, [])
+    assert (status, body_read) == (401, False)
+    assert limiter.admitted_total == 0
+
+
+def test_middleware_releases_the_slot_after_the_request():
+    limiter = make_limiter()
+    token = auth.create_access_token({"sub": "teacher@example.com"})
+    status, body_read = call_upload(limiter, [(b"authorization", f"Bearer {token}".encode())])
+    assert (status, body_read) == (200, True)
+    assert limiter.admitted_total == 1
+    assert limiter.active == 0 and not limiter.active_by_key
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import events
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_full_queue_drops_oldest_events():
+    async def scenario():
+        broker = events.InProcessBroker(max_queue=2)
+        subscription = broker.subscribe("t", heartbeat=0.01)
+        # The first heartbeat means the subscription is registered
+        assert await subscription.__anext__() is None
+        for n in range(5):
+            broker.publish("t", {"type": "graded", "n": n})
+        await asyncio.sleep(0)
+        received = [await subscription.__anext__(), await subscription.__anext__()]
+        await subscription.aclose()
+        return received, broker
+
+    received, broker = asyncio.run(scenario())
+    assert [e["n"] for e in received] == [3, 4]
+    assert not broker._subscribers
+
+
+def test_file_broker_delivers_events_from_other_processes(tmp_path):
+    async def scenario():
+        broker = events.FileBroker(str(tmp_path), poll=0.01)
+        broker.publish("test:1", {"type": "graded", "n": 0})
+        subscription = broker.subscribe("test:1", heartbeat=0.01)
+        assert await subscription.__anext__() is None
+        subprocess.run([
+            sys.executable, "-c",
+            "import sys, events; broker = events.FileBroker(sys.argv[1]);"
+            "broker.publish('test:1', {'type': 'graded', 'n': 1});"
+            "broker.publish('test:2', {'type': 'graded', 'n': 2})",
+            str(tmp_path),
+        ], cwd=ROOT, check=True)
+        event = await asyncio.wait_for(subscription.__anext__(), 5)
+        await subscription.aclose()
+        return event
+
+    # Events published before subscribing and to other topics are not delivered
+    assert asyncio.run(scenario()) == {"type": "graded", "n": 1}
+
+
+def test_file_broker_recovers_from_truncation(tmp_path):
+    async def scenario():
+        broker = events.FileBroker(str(tmp_path), poll=0.01, max_bytes=40)
+        subscription = broker.subscribe("t", heartbeat=0.01)
+        assert await subscription.__anext__() is None
+        broker.publish("t", {"type": "graded", "n": 0})
+        broker.publish("t", {"type": "graded", "n": 1})
+        first = [await subscription.__anext__(), await subscription.__anext__()]
+        # Past max_bytes, the next publish starts the file over
+        broker.publish("t", {"type": "graded", "n": 2})
+        second = await asyncio.wait_for(subscription.__anext__(), 5)
+        await subscription.aclose()
+        return first + [second]
+
+    assert [e["n"] for e in asyncio.run(scenario())] == [0, 1, 2]
+
+
+def create_test(client, headers):
+    subject = client.post("/subjects/", json={"name": "Maths"}, headers=headers).json()
+    return client.post("/tests/", json={
+        "title": "Quiz", "max_marks": 1, "subject_id": subject["id"], "student_ids": [],
+        "question_paper": [{"question": "Q", "answer": "A", "marks": 1}],
+    }, headers=headers).json()
+
+
+def read_stream(app, path, headers, publish, count):
+    """Opens an SSE request against `app`, calls `publish` once subscribed and returns `count` event frames."""
+    async def scenario():
+        frames = asyncio.Queue()
+        disconnected = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                assert message["status"] == 200
+                assert (b"content-type", b"text/event-stream; charset=utf-8") in message["headers"]
+            elif message["body"]:
+                await frames.put(message["body"].decode())
+
+        scope = {
+            "type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "", "scheme": "http", "server": ("testserver", 80),
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        }
+        response = asyncio.create_task(app(scope, receive, send))
+        # A keep-alive comment is only sent once the stream is subscribed
+        assert await asyncio.wait_for(frames.get(), 5) == ": keep-alive\n\n"
+        publish()
+        received = []
+        while len(received) < count:
+            frame = await asyncio.wait_for(frames.get(), 5)
+            if not frame.startswith(":"):
+                received.append(frame)
+        disconnected.set()
+        await asyncio.wait_for(response, 5)
+        return received
+
+    return asyncio.run(scenario())
+
+
+def test_events_stream_grading_progress(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(events, "HEARTBEAT_SECONDS", 0.01)
+    test = create_test(client, auth_headers)
+    topic = events.test_topic(test["id"])
+
+    def publish():
+        events.publish(topic, "extracted", student_id=1, answers_found=3)
+        events.publish(topic, "graded", student_id=1, result_id=7, score=2.5, max_marks=3)
+        events.publish(topic, "error", student_id=2, error={"code": "invalid_pdf", "message": "bad"})
+
+    frames = read_stream(client.app, f"/tests/{test['id']}/events", auth_headers, publish, 3)
+    parsed = [(f.split("\n")[0], json.loads(f.split("\n")[1][len("data: "):])) for f in frames]
+    assert [name for name, _ in parsed] == ["event: extracted", "event: graded", "event: error"]
+    assert parsed[1][1]["score"] == 2.5
+    assert parsed[2][1]["error"]["code"] == "invalid_pdf"
+
+
+def test_events_of_another_teachers_test_are_404(client, auth_headers):
+    test = create_test(client, auth_headers)
+    client.post("/register", json={"email": "other@example.com", "password": "secret", "full_name": "Other", "mobile": "2"})
+    token = client.post("/token", data={"username": "other@example.com", "password": "secret"}).json()["access_token"]
+    response = client.get(f"/tests/{test['id']}/events", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404
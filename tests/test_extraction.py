@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+
+import pytest
+
+import extraction
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    extraction.shutdown_pool()
+    yield
+    extraction.shutdown_pool()
+
+
+def extraction_error(*args, **kwargs) -> extraction.ExtractionError:
+    with pytest.raises(extraction.ExtractionError) as exc:
+        extraction.extract_text(*args, **kwargs)
+    return exc.value
+
+
+def test_extracts_text():
+    assert "Q:" in extraction.extract_text(os.path.join(ROOT, "sample_questions.pdf"))
+
+
+def test_invalid_pdf_is_400():
+    error = extraction_error(os.path.join(ROOT, "dummy_sheet.txt"))
+    assert (error.code, error.status_code) == ("invalid_pdf", 400)
+
+
+def test_too_many_pages_is_413():
+    error = extraction_error(os.path.join(ROOT, "sample_questions.pdf"), max_pages=0)
+    assert (error.code, error.status_code) == ("too_many_pages", 413)
+    assert error.to_dict()["message"] == "PDF has 1 pages, limit is 0"
+
+
+def test_no_free_worker_is_503(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(extraction, "_slots", slots)
+    monkeypatch.setattr(extraction, "PDF_QUEUE_TIMEOUT_SECONDS", 0)
+    error = extraction_error(os.path.join(ROOT, "sample_questions.pdf"))
+    assert (error.code, error.status_code) == ("busy", 503)
+
+
+def test_stuck_worker_is_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction, "PDF_WORKERS", 1)
+    monkeypatch.setattr(extraction, "_slots", threading.BoundedSemaphore(1))
+    # Opening a FIFO with no writer blocks the worker until its own alarm
+    # fires, well after the parent has given up on it
+    fifo = tmp_path / "stuck.pdf"
+    os.mkfifo(fifo)
+    monkeypatch.setattr(extraction, "_GRACE_SECONDS", -2.5)
+    stuck_pool = extraction.get_pool()
+    error = extraction_error(str(fifo), timeout=3)
+    assert (error.code, error.status_code) == ("timeout", 422)
+
+    # The next job runs on a fresh pool instead of queueing behind the stuck worker
+    monkeypatch.setattr(extraction, "_GRACE_SECONDS", 5)
+    started = time.monotonic()
+    assert "Q:" in extraction.extract_text(os.path.join(ROOT, "sample_questions.pdf"))
+    assert time.monotonic() - started < 2
+    assert extraction.get_pool() is not stuck_pool
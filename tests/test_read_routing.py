@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import database
+
+
+@pytest.fixture
+def replica_setup(tmp_path, monkeypatch):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine, name in ((primary, "primary"), (replica, "replica")):
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE which (name TEXT)"))
+            conn.execute(text("INSERT INTO which VALUES (:name)"), {"name": name})
+    monkeypatch.setattr(database, "engine", primary)
+    monkeypatch.setattr(database, "read_engine", replica)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=primary))
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=replica))
+    monkeypatch.setattr(database, "_last_write", {})
+    monkeypatch.setattr(database, "_replica_down_until", 0.0)
+    return primary, replica
+
+
+def read_from(teacher):
+    sessions = database.read_session(teacher)
+    db = next(sessions)
+    try:
+        return db.execute(text("SELECT name FROM which")).scalar()
+    finally:
+        sessions.close()
+
+
+def test_reads_use_replica_until_the_teacher_writes(replica_setup):
+    assert read_from("a@example.com") == "replica"
+    database.mark_write("a@example.com")
+    assert read_from("a@example.com") == "primary"
+    # Other teachers are not affected
+    assert read_from("b@example.com") == "replica"
+
+
+def test_stickiness_expires(replica_setup, monkeypatch):
+    monkeypatch.setattr(database, "READ_YOUR_WRITES_SECONDS", 0)
+    database.mark_write("a@example.com")
+    assert read_from("a@example.com") == "replica"
+
+
+def test_unreachable_replica_is_skipped_for_a_while(replica_setup, monkeypatch):
+    attempts = []
+
+    def failing_connect():
+        attempts.append(1)
+        raise sqlite3.OperationalError("replica down")
+
+    broken = create_engine("sqlite://", creator=failing_connect)
+    monkeypatch.setattr(database, "read_engine", broken)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=broken))
+
+    assert read_from("a@example.com") == "primary"
+    assert read_from("a@example.com") == "primary"
+    assert len(attempts) == 1
+
+
+def test_read_endpoints_do_not_open_a_primary_session(client, auth_headers):
+    primary_sessions = []
+    get_db = client.app.dependency_overrides[database.get_db]
+
+    def counting_get_db():
+        primary_sessions.append(1)
+        yield from get_db()
+
+    client.app.dependency_overrides[database.get_db] = counting_get_db
+    for path in ("/subjects/", "/students/", "/tests/", "/dashboard/"):
+        assert client.get(path, headers=auth_headers).status_code == 200
+    assert primary_sessions == []
+    # Writes still use the primary
+    client.post("/subjects/", json={"name": "Physics"}, headers=auth_headers)
+    assert primary_sessions == [1]
@@ -0,0 +1,60 @@
+import pytest
+from pydantic import ValidationError
+
+import rubric
+import schemas
+import utils
+
+
+def test_matcher_only_reports_whole_words():
+    matcher = rubric.KeywordMatcher({"cell": 0, "cell wall": 1, "wall": 2})
+    assert matcher.find("the cellular membrane") == set()
+    assert matcher.find("a cell wall") == {0, 1, 2}
+    assert matcher.find("walls of the cell") == {0}
+
+
+def test_matcher_reports_overlapping_phrases():
+    matcher = rubric.KeywordMatcher({"he": 0, "she": 1, "his": 2, "hers": 3})
+    assert matcher.find("she said hers") == {1, 3}
+    assert matcher.find("ushers") == set()
+    assert matcher.find("he she his hers") == {0, 1, 2, 3}
+
+
+def make_rubric():
+    return rubric.CompiledRubric([
+        {"keyword": "chlorophyll", "synonyms": ["green pigment"], "weight": 1.0, "required": True},
+        {"keyword": "sunlight", "synonyms": ["light energy"], "weight": 2.0},
+        {"keyword": "glucose", "synonyms": [], "weight": 1.0},
+    ])
+
+
+def test_score_is_weighted_fraction_of_matched_terms():
+    fraction, keywords = make_rubric().score("The Green Pigment absorbs light energy.")
+    assert fraction == pytest.approx(0.75)
+    assert keywords == ["chlorophyll", "sunlight"]
+
+
+def test_missing_required_term_scores_zero():
+    fraction, keywords = make_rubric().score("sunlight becomes glucose")
+    assert fraction == 0.0
+    assert keywords == ["sunlight", "glucose"]
+
+
+def test_check_answers_uses_rubric_and_keeps_exact_match():
+    paper = [{
+        "question": "Photosynthesis?", "answer": "plants make food", "marks": 4,
+        "rubric": [{"keyword": "chlorophyll", "weight": 1}, {"keyword": "sunlight", "weight": 1}],
+    }]
+    score, processed = utils.check_answers([{"question": "Photosynthesis?", "answer": "Sunlight only"}], paper)
+    assert score == 2.0
+    assert processed[0]["matched_keywords"] == ["sunlight"]
+
+    score, processed = utils.check_answers([{"question": "Photosynthesis?", "answer": "Plants make food"}], paper)
+    assert score == 4.0
+    assert "matched_keywords" not in processed[0]
+
+
+@pytest.mark.parametrize("weight", [0, -1])
+def test_rubric_weights_must_be_positive(weight):
+    with pytest.raises(ValidationError):
+        schemas.RubricTerm(keyword="x", weight=weight)
@@ -0,0 +1,130 @@
+from sqlalchemy.orm import Session
+
+import models
+import similarity
+
+COPIED = "hamlet was written by william shakespeare around the year sixteen hundred in london"
+ORIGINAL = "the play is a tragedy about a danish prince who seeks revenge for his murdered father"
+
+
+def rows_for(answers_by_result):
+    """(result_id, student_id, answer) -> rows as stored in answer_signatures."""
+    rows = []
+    for result_id, student_id, answer in answers_by_result:
+        for q_key, signature, bands in similarity.sign_answers([{"question": "Q", "student_answer": answer}]):
+            rows.append((result_id, student_id, q_key, signature, bands))
+    return rows
+
+
+def students(cluster):
+    return [a["student_id"] for a in cluster["answers"]]
+
+
+def test_copied_answers_are_grouped():
+    rows = rows_for([(1, 1, COPIED), (2, 2, COPIED), (3, 3, ORIGINAL)])
+    clusters = similarity.find_similar_clusters(rows, threshold=0.8)
+    assert [students(c) for c in clusters] == [[1, 2]]
+    assert clusters[0]["similarity"] == 1.0
+
+
+def test_threshold_filters_partial_overlap():
+    edited = COPIED.replace("london", "stratford upon avon")
+    rows = rows_for([(1, 1, COPIED), (2, 2, edited)])
+    score = similarity.find_similar_clusters(rows, threshold=0.5)[0]["similarity"]
+    assert 0.5 <= score < 1.0
+    assert similarity.find_similar_clusters(rows, threshold=min(1.0, score + 0.01)) == []
+
+
+def test_reuploads_are_deduplicated_per_student():
+    # Student 1 uploaded twice; the latest sheet is reported once, and the
+    # student's two sheets alone do not make a cluster
+    rows = rows_for([(1, 1, COPIED), (2, 1, COPIED), (3, 2, COPIED)])
+    clusters = similarity.find_similar_clusters(rows, threshold=0.8)
+    assert [c["answers"] for c in clusters] == [[{"student_id": 1, "result_id": 2}, {"student_id": 2, "result_id": 3}]]
+    assert similarity.find_similar_clusters(rows[:2], threshold=0.8) == []
+
+
+def test_answers_matching_the_model_answer_are_ignored():
+    model_answers = similarity.model_answer_signatures([{"question": "Q", "answer": COPIED}])
+    rows = rows_for([(1, 1, COPIED), (2, 2, COPIED), (3, 3, ORIGINAL), (4, 4, ORIGINAL)])
+    clusters = similarity.find_similar_clusters(rows, threshold=0.8, model_answers=model_answers)
+    assert [students(c) for c in clusters] == [[3, 4]]
+
+
+def test_a_class_with_the_same_answer_is_one_cluster(monkeypatch):
+    signed = rows_for([(0, 0, ORIGINAL)])[0]
+    rows = [(n, n) + signed[2:] for n in range(1000)]
+    comparisons = []
+    estimate = similarity.estimate_similarity
+
+    def counting_estimate(a, b):
+        comparisons.append(1)
+        return estimate(a, b)
+
+    monkeypatch.setattr(similarity, "estimate_similarity", counting_estimate)
+    clusters = similarity.find_similar_clusters(rows, threshold=0.8)
+    assert len(clusters) == 1 and len(clusters[0]["answers"]) == 1000
+    # One comparison per answer, not per pair
+    assert len(comparisons) < 1000
+
+
+def test_short_answers_are_not_signed():
+    assert similarity.sign_answers([{"question": "Q", "student_answer": "Paris"}]) == []
+
+
+def seed_graded_test(db_engine, teacher_email):
+    with Session(db_engine) as db:
+        teacher = db.query(models.User).filter(models.User.email == teacher_email).first()
+        subject = models.Subject(name="English", teacher_id=teacher.id)
+        student = models.Student(roll_no="7", name="S", mobile="1")
+        test = models.Test(title="T", max_marks=1, subject=subject, question_paper=[{"question": "Q", "answer": "A", "marks": 1}])
+        test.students = [student]
+        result = models.TestResult(test=test, student=student, score=0,
+                                   student_answers=[{"question": "Q", "student_answer": COPIED}])
+        db.add(result)
+        db.flush()
+        similarity.index_result(result)
+        db.commit()
+        assert db.query(models.AnswerSignature).count() == 1
+        return test.id, student.id
+
+
+def test_deleting_graded_test_removes_signatures(client, auth_headers, db_engine):
+    test_id, _ = seed_graded_test(db_engine, "teacher@example.com")
+    assert client.delete(f"/tests/{test_id}", headers=auth_headers).status_code == 200
+    with Session(db_engine) as db:
+        assert db.query(models.AnswerSignature).count() == 0
+
+
+def test_deleting_graded_student_removes_signatures(client, auth_headers, db_engine):
+    _, student_id = seed_graded_test(db_engine, "teacher@example.com")
+    assert client.delete(f"/students/{student_id}", headers=auth_headers).status_code == 200
+    with Session(db_engine) as db:
+        assert db.query(models.AnswerSignature).count() == 0
+
+
+def test_backfill_indexes_each_result_once(db_engine, auth_headers):
+    seed_graded_test(db_engine, "teacher@example.com")
+    with Session(db_engine) as db:
+        # As if graded before the similarity index existed, plus a sheet
+        # whose answers are all too short to sign
+        db.query(models.AnswerSignature).delete()
+        db.query(models.IndexedResult).delete()
+        test = db.query(models.Test).one()
+        db.add(models.TestResult(test=test, score=0, student_answers=[{"question": "Q", "student_answer": "Paris"}]))
+        db.commit()
+
+        assert similarity.backfill_signatures(db, batch_size=1) == 2
+        assert db.query(models.AnswerSignature).count() == 1
+        assert db.query(models.IndexedResult).count() == 2
+        # Indexed results are not selected again, even without signatures
+        assert similarity.backfill_signatures(db) == 0
+
+
+def test_similarity_of_another_teachers_test_is_404_even_with_an_etag(client, auth_headers, db_engine):
+    test_id, _ = seed_graded_test(db_engine, "teacher@example.com")
+    assert client.get(f"/tests/{test_id}/similarity", headers=auth_headers).json()["clusters"] == []
+    client.post("/register", json={"email": "other@example.com", "password": "secret", "full_name": "Other", "mobile": "2"})
+    token = client.post("/token", data={"username": "other@example.com", "password": "secret"}).json()["access_token"]
+    response = client.get(f"/tests/{test_id}/similarity", headers={"Authorization": f"Bearer {token}", "If-None-Match": "*"})
+    assert response.status_code == 404
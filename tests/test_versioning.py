@@ -0,0 +1,89 @@
+import pytest
+
+
+def get_with_etag(client, path, headers, etag):
+    return client.get(path, headers={**headers, "If-None-Match": etag})
+
+
+def test_unchanged_list_returns_304(client, auth_headers):
+    first = client.get("/subjects/", headers=auth_headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = get_with_etag(client, "/subjects/", auth_headers, etag)
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+
+
+def test_write_changes_etag(client, auth_headers):
+    etag = client.get("/subjects/", headers=auth_headers).headers["etag"]
+
+    client.post("/subjects/", json={"name": "Physics"}, headers=auth_headers)
+
+    after = get_with_etag(client, "/subjects/", auth_headers, etag)
+    assert after.status_code == 200
+    assert after.headers["etag"] != etag
+    assert [s["name"] for s in after.json()] == ["Physics"]
+    assert get_with_etag(client, "/subjects/", auth_headers, after.headers["etag"]).status_code == 304
+
+
+def create_graded_test(client, auth_headers, db_engine):
+    """A test with one graded sheet; returns (test_id, student_id, result_id)."""
+    from sqlalchemy.orm import Session
+    import models
+
+    client.post("/subjects/", json={"name": "History"}, headers=auth_headers)
+    student = client.post("/students/", json={"roll_no": "1", "name": "A", "mobile": "1"}, headers=auth_headers).json()
+    test = client.post("/tests/", json={
+        "title": "Quiz", "max_marks": 1, "subject_id": 1, "student_ids": [student["id"]],
+        "question_paper": [{"question": "Who?", "answer": "Me", "marks": 1}],
+    }, headers=auth_headers).json()
+    with Session(db_engine) as db:
+        result = models.TestResult(test_id=test["id"], student_id=student["id"], score=0, student_answers=[])
+        db.add(result)
+        db.commit()
+        return test["id"], student["id"], result.id
+
+
+def test_result_update_changes_test_etag(client, auth_headers, db_engine):
+    test_id, student_id, result_id = create_graded_test(client, auth_headers, db_engine)
+    students_etag = client.get("/students/", headers=auth_headers).headers["etag"]
+    tests_etag = client.get("/tests/", headers=auth_headers).headers["etag"]
+    results_etag = client.get(f"/tests/{test_id}/results/", headers=auth_headers).headers["etag"]
+
+    client.put(f"/results/{result_id}", json={
+        "test_id": test_id, "student_id": student_id, "score": 1,
+        "student_answers": [{"question": "Who?", "student_answer": "me"}],
+    }, headers=auth_headers)
+    after = get_with_etag(client, f"/tests/{test_id}/results/", auth_headers, results_etag)
+    assert after.status_code == 200
+    assert after.json()[0]["score"] == 1
+    # Writes in one scope leave the others alone
+    assert get_with_etag(client, "/students/", auth_headers, students_etag).status_code == 304
+    assert get_with_etag(client, "/tests/", auth_headers, tests_etag).status_code == 304
+
+
+def test_student_delete_changes_etags_of_their_tests(client, auth_headers, db_engine):
+    test_id, student_id, _ = create_graded_test(client, auth_headers, db_engine)
+    results_etag = client.get(f"/tests/{test_id}/results/", headers=auth_headers).headers["etag"]
+    similarity_etag = client.get(f"/tests/{test_id}/similarity", headers=auth_headers).headers["etag"]
+
+    assert client.delete(f"/students/{student_id}", headers=auth_headers).status_code == 200
+    after = get_with_etag(client, f"/tests/{test_id}/results/", auth_headers, results_etag)
+    assert after.status_code == 200
+    assert after.json()[0]["student_id"] is None
+    assert get_with_etag(client, f"/tests/{test_id}/similarity", auth_headers, similarity_etag).status_code == 200
+
+
+def test_bump_does_not_swallow_caller_flush_errors(db_engine):
+    from sqlalchemy.exc import IntegrityError
+    from sqlalchemy.orm import Session
+    import models, versioning
+
+    with Session(db_engine) as db:
+        db.add(models.User(email="dup@example.com", hashed_password="x"))
+        db.commit()
+        db.add(models.User(email="dup@example.com", hashed_password="x"))
+        with pytest.raises(IntegrityError):
+            versioning.bump(db, versioning.teacher_scope(1))
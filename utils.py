@@ -1,10 +1,17 @@
-from pypdf import PdfReader
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import re
+import rubric
 
-def extract_text_from_pdf(file_path: str) -> str:
+class PageLimitError(ValueError):
+    pass
+
+def extract_text_from_pdf(file_path: str, max_pages: Optional[int] = None) -> str:
     """Extracts all text from a PDF file."""
+    # Imported here so only the extraction workers pay for pypdf
+    from pypdf import PdfReader
     reader = PdfReader(file_path)
+    if max_pages is not None and len(reader.pages) > max_pages:
+        raise PageLimitError(f"PDF has {len(reader.pages)} pages, limit is {max_pages}")
     text = ""
     for page in reader.pages:
         text += page.extract_text() + "\n"
@@ -77,3 +84,52 @@ def parse_qa_from_text(text: str) -> List[Dict[str, Any]]:
         qa_list.append({"question": current_q.strip(), "answer": current_a.strip()})
         
     return qa_list
+
+def check_answers(student_answers: List[Dict[str, str]], question_paper: List[Dict[str, Any]]) -> tuple[float, List[Dict[str, Any]]]:
+    """
+    Simple automated checking logic. 
+    In a real scenario, this would use OCR and NLP.
+    For this implementation, we'll compare strings, or score
+    keywords for questions that define a rubric.
+    """
+    total_score = 0.0
+    processed_answers = []
+    
+    # Create a map for quick lookup
+    paper_map = {q['question']: q for q in question_paper}
+    rubrics = rubric.compile_paper(question_paper)
+    
+    for ans in student_answers:
+        q_text = ans.get('question')
+        s_ans = ans.get('answer', '').strip().lower()
+        
+        if q_text in paper_map:
+            correct_ans = paper_map[q_text]['answer'].strip().lower()
+            marks = paper_map[q_text]['marks']
+            
+            matched_keywords = None
+            
+            # Simple exact match or keyword match
+            if s_ans == correct_ans:
+                obtained = marks
+            elif q_text in rubrics: # Rubric keyword scoring
+                fraction, matched_keywords = rubrics[q_text].score(s_ans)
+                obtained = marks * fraction
+            elif correct_ans in s_ans: # Partial match logic
+                obtained = marks * 0.8
+            else:
+                obtained = 0.0
+                
+            total_score += obtained
+            processed = {
+                "question": q_text,
+                "student_answer": s_ans,
+                "correct_answer": correct_ans,
+                "marks_obtained": obtained,
+                "max_marks": marks
+            }
+            if matched_keywords is not None:
+                processed["matched_keywords"] = matched_keywords
+            processed_answers.append(processed)
+            
+    return total_score, processed_answers
@@ -0,0 +1,61 @@
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+
+# Version scopes. A scope's counter is bumped in the same transaction as
+# every write that changes what its read endpoints return.
+STUDENTS = "students"
+
+def teacher_scope(teacher_id: int) -> str:
+    """Subjects, tests and profile of one teacher."""
+    return f"teacher:{teacher_id}"
+
+def test_scope(test_id: int) -> str:
+    """Results of one test."""
+    return f"test:{test_id}"
+
+def get_version(db: Session, scope: str) -> int:
+    version = db.query(models.ResourceVersion.version).filter(models.ResourceVersion.scope == scope).scalar()
+    return version or 0
+
+def bump(db: Session, *scopes: str):
+    """Increments the counters of `scopes`. Call before the write is committed."""
+    for scope in scopes:
+        updated = db.query(models.ResourceVersion).filter(models.ResourceVersion.scope == scope).update(
+            {models.ResourceVersion.version: models.ResourceVersion.version + 1},
+            synchronize_session=False,
+        )
+        if updated:
+            continue
+        # Flush the caller's pending changes first so their errors are not
+        # mistaken for the insert race handled below
+        db.flush()
+        try:
+            with db.begin_nested():
+                db.add(models.ResourceVersion(scope=scope, version=1))
+        except IntegrityError:
+            # Another request created the row first
+            db.query(models.ResourceVersion).filter(models.ResourceVersion.scope == scope).update(
+                {models.ResourceVersion.version: models.ResourceVersion.version + 1},
+                synchronize_session=False,
+            )
+
+def etag(scope: str, version: int) -> str:
+    return f'W/"{scope}:{version}"'
+
+def check_not_modified(request: Request, response: Response, db: Session, scope: str) -> Optional[Response]:
+    """
+    Returns a 304 response if the client's If-None-Match matches the current
+    version of `scope`; otherwise sets the ETag on `response` and returns None.
+    """
+    tag = etag(scope, get_version(db, scope))
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [t.strip() for t in if_none_match.split(",")]
+        if "*" in candidates or tag in candidates or tag[2:] in candidates:
+            return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "private, no-cache"})
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return None